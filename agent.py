@@ -1,9 +1,17 @@
 from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart
+from pydantic_ai.models.openai import OpenAIChatModel
+from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic import BaseModel
-from typing import List, Dict, Any
-import json
-from langchain.schema import Document
-import os
+import pydantic_core
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional
+from functools import cache
+import msgspec
+import orjson
+import queue
+import tiktoken
+from cache import agent_cache, agent_response_key
+from clients import get_openai_client, run_async, submit_async
 
 
 class LogAnalysisResponse(BaseModel):
@@ -11,11 +19,7 @@ class LogAnalysisResponse(BaseModel):
     relevant_logs: List[Dict[str, Any]]
     total_logs_analyzed: int
 
-# Initialize PydanticAI Agent
-log_analysis_agent = Agent(
-    'openai:gpt-4o',
-    output_type=LogAnalysisResponse,
-    system_prompt="""
+LOG_ANALYSIS_PROMPT = """
     You are an intelligent log analysis assistant. Your job is to:
     
     1. Analyze the provided log entries to answer the user's question
@@ -30,40 +34,228 @@ log_analysis_agent = Agent(
     - The total number of logs you analyzed
     
     Make your analysis thorough and insightful.
+"""
+
+
+@cache
+def get_agent(api_key: str) -> Agent:
+    # Initialize PydanticAI Agent on a shared OpenAI client
+    model = OpenAIChatModel(
+        "gpt-4o",
+        provider=OpenAIProvider(openai_client=get_openai_client(api_key))
+    )
+    return Agent(
+        model,
+        output_type=LogAnalysisResponse,
+        system_prompt=LOG_ANALYSIS_PROMPT
+    )
+
+
+# Token budget for the prompt sent to the model
+CONTEXT_TOKEN_BUDGET = 100_000
+# Tokens reserved for the prompt template and separators between log entries
+PROMPT_TOKEN_RESERVE = 1_000
+
+log_decoder = msgspec.json.Decoder()
+
+
+@cache
+def get_token_encoding() -> tiktoken.Encoding:
+    # Loaded on first use, since tiktoken downloads the encoding the first time
+    return tiktoken.encoding_for_model("gpt-4o")
+
+
+def _count_tokens(log_data: Dict[str, Any]) -> int:
+    return len(get_token_encoding().encode(orjson.dumps(log_data, default=str).decode()))
+
+
+def _truncate_raw_content(text: str, budget: int) -> Optional[Dict[str, Any]]:
+    # Shrink the kept prefix until the serialized entry, escapes included, fits
+    token_encoding = get_token_encoding()
+    tokens = token_encoding.encode(text)
+    keep = budget
+    while keep > 0:
+        log_data = {"raw_content": token_encoding.decode(tokens[:keep])}
+        size = _count_tokens(log_data)
+        if size <= budget:
+            return log_data
+        keep -= size - budget
+    return None
+
+
+def _fit_to_budget(question: str, context_logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Keep whole log entries while they fit, then truncate the first one that overflows
+    remaining = CONTEXT_TOKEN_BUDGET - len(get_token_encoding().encode(question)) - PROMPT_TOKEN_RESERVE
+    fitted_logs = []
+    for log_data in context_logs:
+        size = _count_tokens(log_data)
+        if size <= remaining:
+            fitted_logs.append(log_data)
+            remaining -= size
+            continue
+        if remaining > 0:
+            if set(log_data) == {"raw_content"}:
+                text = log_data["raw_content"]
+            else:
+                text = orjson.dumps(log_data, default=str).decode()
+            truncated = _truncate_raw_content(text, remaining)
+            if truncated is not None:
+                fitted_logs.append(truncated)
+        break
+    return fitted_logs
+
+
+def _decode_chunk(chunk: str) -> Any:
+    # Cheap prefix check first, so plain text skips the exception path
+    if chunk.startswith(("{", "[")):
+        try:
+            return log_decoder.decode(chunk)
+        except msgspec.DecodeError:
+            pass
+    return {"raw_content": chunk}
+
+
+def _build_context(question: str, relevant_chunks: List[str]) -> str:
+    # Prepare context from chunks, including non-JSON chunks as text
+    context_logs = [_decode_chunk(chunk) for chunk in relevant_chunks]
+    
+    context_logs = _fit_to_budget(question, context_logs)
+    
+    # Create the prompt with context
+    return f"""
+    Question: {question}
+    
+    Log Entries to Analyze:
+    {orjson.dumps(context_logs, default=str).decode()}
+    
+    Please analyze these logs to answer the question. Provide insights, patterns, and specific findings.
     """
-)
 
-def analyze_logs_with_agent(question: str, relevant_chunks: List[Document], api_key: str) -> LogAnalysisResponse:
+
+def _cached_response(key: str) -> Optional[LogAnalysisResponse]:
+    # A single get, since the entry can be evicted between a check and a read
+    cached = agent_cache.get(key)
+    if cached is None:
+        return None
+    return LogAnalysisResponse.model_validate_json(cached)
+
+
+def _store_response(key: str, response: LogAnalysisResponse):
+    agent_cache[key] = response.model_dump_json()
+
+
+def _error_response(error: Exception) -> LogAnalysisResponse:
+    # Report failures in the expected response format
+    return LogAnalysisResponse(
+        answer=f"Error analyzing logs: {str(error)}",
+        relevant_logs=[],
+        total_logs_analyzed=0
+    )
+
+
+async def analyze_logs_with_agent_async(question: str, relevant_chunks: List[str], api_key: str) -> LogAnalysisResponse:
     try:
-        # Prepare context from chunks
-        context_logs = []
-        for doc in relevant_chunks:
-            try:
-                log_data = json.loads(doc.page_content)
-                context_logs.append(log_data)
-            except json.JSONDecodeError:
-                # If not valid JSON, include as text
-                context_logs.append({"raw_content": doc.page_content})
-        
-        # Create the prompt with context
-        context_text = f"""
-        Question: {question}
-        
-        Log Entries to Analyze:
-        {json.dumps(context_logs, indent=2, default=str)}
-        
-        Please analyze these logs to answer the question. Provide insights, patterns, and specific findings.
-        """
+        # Reuse the stored response for an identical question and log set
+        key = agent_response_key(question, relevant_chunks)
+        cached = _cached_response(key)
+        if cached is not None:
+            return cached
 
-        os.environ["OPENAI_API_KEY"] = api_key
+        context_text = _build_context(question, relevant_chunks)
 
-        result = log_analysis_agent.run_sync(context_text)
+        result = await get_agent(api_key).run(context_text)
+        _store_response(key, result.output)
         return result.output
         
     except Exception as e:
-        # Return error response in expected format
-        return LogAnalysisResponse(
-            answer=f"Error analyzing logs: {str(e)}",
-            relevant_logs=[],
-            total_logs_analyzed=0
-        )
\ No newline at end of file
+        return _error_response(e)
+
+
+def analyze_logs_with_agent(question: str, relevant_chunks: List[str], api_key: str) -> LogAnalysisResponse:
+    return run_async(analyze_logs_with_agent_async(question, relevant_chunks, api_key))
+
+
+# Marks the end of the chunks handed from the event loop to the iterator
+_STREAM_END = object()
+
+
+def _partial_answer(response: ModelResponse) -> str:
+    # Read the answer from the partial output JSON before the other required
+    # fields have been generated and the full output can validate
+    for part in response.parts:
+        if isinstance(part, ToolCallPart):
+            raw = part.args
+        elif isinstance(part, TextPart):
+            raw = part.content
+        else:
+            continue
+        if isinstance(raw, str):
+            try:
+                raw = pydantic_core.from_json(raw, allow_partial="trailing-strings")
+            except ValueError:
+                continue
+        if isinstance(raw, dict) and isinstance(raw.get("answer"), str):
+            return raw["answer"]
+    return ""
+
+
+class LogAnalysisStream:
+    """
+    Stream the agent's answer as it is generated
+
+    Iterating yields chunks of answer text; once exhausted, `response`
+    holds the final structured LogAnalysisResponse.
+    """
+
+    def __init__(self, question: str, relevant_chunks: List[str], api_key: str):
+        self.question = question
+        self.relevant_chunks = relevant_chunks
+        self.api_key = api_key
+        self.response: Optional[LogAnalysisResponse] = None
+
+    async def _stream(self) -> AsyncIterator[str]:
+        try:
+            # Reuse the stored response for an identical question and log set
+            key = agent_response_key(self.question, self.relevant_chunks)
+            cached = _cached_response(key)
+            if cached is not None:
+                self.response = cached
+                yield self.response.answer
+                return
+
+            context_text = _build_context(self.question, self.relevant_chunks)
+
+            answer = ""
+            async with get_agent(self.api_key).run_stream(context_text) as result:
+                async for partial in result.stream_response():
+                    partial_answer = _partial_answer(partial)
+                    if len(partial_answer) > len(answer):
+                        yield partial_answer[len(answer):]
+                        answer = partial_answer
+                self.response = await result.get_output()
+            _store_response(key, self.response)
+            if len(self.response.answer) > len(answer):
+                yield self.response.answer[len(answer):]
+
+        except Exception as e:
+            self.response = _error_response(e)
+            yield self.response.answer
+
+    async def _pump(self, chunks: queue.Queue):
+        try:
+            async for chunk in self._stream():
+                chunks.put(chunk)
+        finally:
+            chunks.put(_STREAM_END)
+
+    def __iter__(self) -> Iterator[str]:
+        # Run the whole stream as one task on the shared loop, since pydantic-ai
+        # sets and resets context variables across steps of the stream
+        chunks = queue.Queue()
+        future = submit_async(self._pump(chunks))
+        try:
+            while (chunk := chunks.get()) is not _STREAM_END:
+                yield chunk
+            future.result()
+        finally:
+            future.cancel()
@@ -1,10 +1,80 @@
 import streamlit as st
-import json
-from langchain.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.schema import Document
 import os
-from agent import analyze_logs_with_agent
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timezone
+from agent import LogAnalysisStream
+from ingest import HNSW_METADATA, IngestProgress, get_collection, ingest
+from log_metadata import filter_log_ids, list_sources
+import retrieval
+
+
+@st.cache_resource
+def get_log_collection():
+    """
+    Open the ChromaDB collection once and reuse it across reruns
+    """
+    return get_collection()
+
+
+@st.cache_data
+def get_log_sources():
+    """
+    List the agent names in the metadata file, refreshed after each ingestion
+    """
+    return list_sources()
+
+
+def start_ingestion(data, api_key):
+    """
+    Process an uploaded JSON file in a background worker thread
+    
+    The thread shares this process's ChromaDB client, so queries see the new
+    entries as soon as they are stored.
+    
+    Args:
+        data (bytes): Contents of the uploaded JSON file
+        api_key (str): OpenAI API key
+    """
+    progress = IngestProgress()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+    st.session_state.ingest_executor = executor
+    st.session_state.ingest_future = executor.submit(ingest, data, api_key, progress)
+    st.session_state.ingest_progress = progress
+    st.session_state.pop("ingest_result", None)
+
+
+def show_ingestion_progress():
+    """
+    Poll the background ingestion and render its progress
+    """
+    future = st.session_state.ingest_future
+    progress = st.session_state.ingest_progress
+    if not future.done():
+        total = progress.total
+        done = progress.done
+        if not total:
+            st.progress(0.0, text="Reading JSON logs...")
+            return
+        st.info(f"Found {total} log entries")
+        # Embedding fills the first half of the bar, storing the second
+        if done < total:
+            text = f"Embedding log entries ({done}/{total})..."
+        else:
+            text = f"Storing in ChromaDB ({done - total}/{total})..."
+        st.progress(done / (2 * total), text=text)
+        return
+    
+    exception = future.exception()
+    st.session_state.ingest_result = exception if exception else future.result()
+    st.session_state.ingest_executor.shutdown()
+    for key in ("ingest_executor", "ingest_future", "ingest_progress"):
+        del st.session_state[key]
+    
+    # Pick up the agent names added by this ingestion
+    get_log_sources.clear()
+    st.rerun()
+
+
 # Set page config
 st.set_page_config(page_title="JSON Log Processor", page_icon="📊")
 
@@ -28,80 +98,50 @@ with tab1:
             st.error("Please upload a JSON file")
         elif not api_key:
             st.error("Please enter your OpenAI API key")
+        elif "ingest_future" in st.session_state:
+            st.warning("Logs are already being processed")
         else:
-            try:
-                # Read JSON file
-                json_data = json.load(uploaded_file)
-                
-                # Check if it's an array
-                if not isinstance(json_data, list):
-                    st.error("JSON file should contain an array of objects")
-                else:
-                    st.info(f"Found {len(json_data)} log entries")
-                    
-                    with st.spinner("Processing logs and storing in ChromaDB..."):
-                        # Initialize OpenAI embeddings
-                        embeddings = OpenAIEmbeddings(
-                            model="text-embedding-ada-002",
-                            openai_api_key=api_key
-                        )
-                        
-                        # Convert each JSON object to Document
-                        documents = []
-                        for i, log_entry in enumerate(json_data):
-                            # Convert JSON object to string
-                            text_content = json.dumps(log_entry)
-                            
-                            # Create Document
-                            doc = Document(
-                                page_content=text_content,
-                                metadata={"index": i}
-                            )
-                            documents.append(doc)
-                        
-                        # Store in ChromaDB
-                        vectorstore = Chroma.from_documents(
-                            documents=documents,
-                            embedding=embeddings,
-                            persist_directory="./chroma_db"
-                        )
-                        
-                        st.success(f"✅ Successfully processed {len(documents)} logs!")
-                        st.info("Embeddings stored in ChromaDB")
-            
-            except json.JSONDecodeError:
-                st.error("Invalid JSON file")
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+            start_ingestion(uploaded_file.getvalue(), api_key)
+    
+    if "ingest_future" in st.session_state:
+        st.fragment(run_every=1)(show_ingestion_progress)()
+    
+    # Report the outcome of the last finished ingestion
+    ingest_result = st.session_state.get("ingest_result")
+    if isinstance(ingest_result, int):
+        st.success(f"✅ Successfully processed {ingest_result} logs!")
+        st.info("Embeddings stored in ChromaDB")
+    elif isinstance(ingest_result, ValueError):
+        st.error(str(ingest_result))
+    elif ingest_result is not None:
+        st.error(f"Error: {str(ingest_result)}")
 
 
-def get_relevant_chunks(question, api_key, k=5):
+def get_relevant_chunks(question, api_key, k=20, top_k=8, ids=None, search_ef=None):
     """
     Fetch relevant chunks from ChromaDB based on the question
     
     Args:
         question (str): User's question
         api_key (str): OpenAI API key
-        k (int): Number of relevant chunks to return
+        k (int): Number of candidate chunks to retrieve
+        top_k (int): Number of re-ranked chunks to return
+        ids (list): Restrict the search to these log entry ids
+        search_ef (int): HNSW search breadth to apply before searching
     
     Returns:
-        list: List of relevant documents
+        list: List of relevant log entry strings
     """
     try:
-        # Initialize embeddings
-        embeddings = OpenAIEmbeddings(
-            model="text-embedding-ada-002",
-            openai_api_key=api_key
-        )
-        # Load existing ChromaDB
-        vectorstore = Chroma(
-            embedding_function=embeddings,
-            persist_directory="./chroma_db"
+        return retrieval.get_relevant_chunks(
+            question,
+            api_key,
+            k=k,
+            top_k=top_k,
+            ids=ids,
+            search_ef=search_ef,
+            collection=get_log_collection()
         )
-        # Search for relevant chunks
-        relevant_docs = vectorstore.similarity_search(question, k=k)
-        return relevant_docs
-    
     except Exception as e:
         st.error(f"Error fetching relevant chunks: {str(e)}")
         return []
@@ -122,34 +162,55 @@ with tab2:
                 placeholder="e.g., What are the most common errors? Show me authentication failures."
             )
             
-            # Number of chunks to retrieve
-            num_chunks = st.slider("Number of log entries to analyze", 1, 20, 5)
+            # Candidates to retrieve, and how many of them reach the agent after re-ranking
+            num_candidates = st.slider("Number of log entries to retrieve", 1, 50, 20)
+            num_chunks = st.slider("Number of log entries to analyze", 1, 20, 8)
+            
+            # HNSW search breadth, higher improves recall at the cost of latency
+            search_ef = st.slider("Search accuracy (HNSW ef)", 16, 512, HNSW_METADATA["hnsw:search_ef"])
+            
+            # Optional filters applied before the vector search
+            with st.expander("🔎 Filters"):
+                min_level = st.slider("Minimum rule level", 0, 15, 0)
+                sources = st.multiselect("Agents", get_log_sources())
+                since_date = st.date_input("Logs since", value=None)
             
             if st.button("🔍 Analyze Logs", type="primary"):
                 if question:
                     with st.spinner("🔍 Searching relevant logs..."):
+                        # Narrow the search to logs matching the filters
+                        filter_ids = None
+                        if min_level or sources or since_date:
+                            since = datetime.combine(since_date, time.min, tzinfo=timezone.utc) if since_date else None
+                            filter_ids = filter_log_ids(min_level=min_level or None, sources=sources, since=since)
+                        
                         # Get relevant chunks
-                        relevant_docs = get_relevant_chunks(question, search_api_key, k=num_chunks)
+                        relevant_docs = get_relevant_chunks(
+                            question,
+                            search_api_key,
+                            k=max(num_candidates, num_chunks),
+                            top_k=num_chunks,
+                            ids=filter_ids,
+                            search_ef=search_ef
+                        )
                         
                         if relevant_docs:
-                            with st.spinner("🧠 Analyzing logs with AI..."):
-                                # Use PydanticAI agent to analyze
-                                response = analyze_logs_with_agent(question, relevant_docs, search_api_key)
-                                
-                                # Display results
-                                st.subheader("📊 Analysis Results")
-                                
-                                # Main answer
-                                st.markdown("### 💡 Answer")
-                                st.write(response.answer)
-
-                                # Show relevant logs from analysis
-                                if response.relevant_logs:
-                                    with st.expander("📄 Relevant Log Entries (From Analysis)"):
-                                        for i, log_entry in enumerate(response.relevant_logs):
-                                            st.markdown(f"**Relevant Log {i+1}:**")
-                                            st.json(log_entry)
-                                            st.divider()
+                            # Display results
+                            st.subheader("📊 Analysis Results")
+                            
+                            # Main answer, streamed from the PydanticAI agent
+                            st.markdown("### 💡 Answer")
+                            analysis_stream = LogAnalysisStream(question, relevant_docs, search_api_key)
+                            st.write_stream(analysis_stream)
+                            response = analysis_stream.response
+
+                            # Show relevant logs from analysis
+                            if response.relevant_logs:
+                                with st.expander("📄 Relevant Log Entries (From Analysis)"):
+                                    for i, log_entry in enumerate(response.relevant_logs):
+                                        st.markdown(f"**Relevant Log {i+1}:**")
+                                        st.json(log_entry)
+                                        st.divider()
                                 
                         else:
                             st.warning("No relevant logs found for your question.")
@@ -0,0 +1,41 @@
+import hashlib
+from typing import List, Optional
+
+import diskcache
+import numpy as np
+
+EMBEDDING_CACHE_PATH = "./emb_cache"
+AGENT_CACHE_PATH = "./agent_cache"
+AGENT_CACHE_SIZE_LIMIT = 500_000_000
+
+embedding_cache = diskcache.Cache(EMBEDDING_CACHE_PATH)
+# Serialized agent responses, evicted least recently used past the size limit
+agent_cache = diskcache.Cache(
+    AGENT_CACHE_PATH,
+    size_limit=AGENT_CACHE_SIZE_LIMIT,
+    eviction_policy="least-recently-used"
+)
+
+
+def embedding_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode()).digest()
+
+
+def get_cached_embedding(key: bytes) -> Optional[np.ndarray]:
+    value = embedding_cache.get(key)
+    if value is None:
+        return None
+    return np.frombuffer(value, dtype=np.float32)
+
+
+def set_cached_embeddings(keys: List[bytes], vectors: np.ndarray):
+    # Store as float32 bytes, half the size of float64 values
+    with embedding_cache.transact():
+        for key, vector in zip(keys, vectors):
+            embedding_cache[key] = np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def agent_response_key(question: str, chunks: List[str]) -> str:
+    # The retrieved set is unordered, so hash the sorted chunk digests
+    chunk_digests = sorted(hashlib.sha256(chunk.encode()).hexdigest() for chunk in chunks)
+    return hashlib.sha256((question + "|" + "|".join(chunk_digests)).encode()).hexdigest()
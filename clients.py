@@ -0,0 +1,43 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from functools import cache
+from typing import Awaitable, TypeVar
+
+import httpx
+from openai import AsyncOpenAI
+
+T = TypeVar("T")
+
+# Long-lived event loop so cached async clients keep their connection pools
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, name="openai-client-loop", daemon=True).start()
+
+
+def submit_async(coro: Awaitable[T]) -> "Future[T]":
+    """
+    Schedule a coroutine on the shared event loop without waiting for it
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _loop)
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """
+    Run a coroutine on the shared event loop and wait for its result
+    """
+    return submit_async(coro).result()
+
+
+@cache
+def get_openai_client(api_key: str) -> AsyncOpenAI:
+    """
+    Create one pooled HTTP/2 OpenAI client per API key
+
+    The client must only be used from coroutines run with run_async.
+    """
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=60
+    )
+    return AsyncOpenAI(api_key=api_key, http_client=http_client)
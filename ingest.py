@@ -0,0 +1,289 @@
+import asyncio
+import uuid
+from functools import cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import chromadb
+import numpy as np
+import orjson
+import tiktoken
+from aiolimiter import AsyncLimiter
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError, RateLimitError
+from tenacity import RetryCallState, retry, retry_if_exception, stop_after_attempt, wait_exponential
+
+from cache import embedding_key, get_cached_embedding, set_cached_embeddings
+from clients import get_openai_client, run_async
+from log_metadata import append_metadata, build_metadata_table, parse_timestamp
+
+CHROMA_PATH = "./chroma_db"
+COLLECTION_NAME = "logs"
+# HNSW index parameters applied when the collection is created
+HNSW_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+# Number of documents added to ChromaDB per call
+INGEST_BATCH_SIZE = 200
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# OpenAI accepts at most 2048 inputs per embeddings request
+EMBEDDING_BATCH_SIZE = 2048
+# OpenAI limits on tokens per embeddings request and per input
+EMBEDDING_MAX_REQUEST_TOKENS = 300_000
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+# Maximum number of embedding requests in flight at once
+EMBEDDING_CONCURRENCY = 35
+EMBEDDING_MAX_RETRIES = 6
+# Longest wait in seconds between attempts, including Retry-After values
+EMBEDDING_MAX_BACKOFF = 32
+# Transient failures retried by the embedding policy; SDK retries are disabled
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+def get_collection():
+    """
+    Open the persistent ChromaDB collection holding the log embeddings
+    """
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return client.get_or_create_collection(COLLECTION_NAME, metadata=HNSW_METADATA)
+
+
+_exponential_wait = wait_exponential(multiplier=1, min=1, max=EMBEDDING_MAX_BACKOFF)
+
+# Requests per minute allowed by the OpenAI tier-1 embeddings limit
+embedding_rate_limiter = AsyncLimiter(max_rate=3500, time_period=60)
+
+
+def _should_retry(exception: BaseException) -> bool:
+    # An exhausted quota does not recover by waiting
+    if isinstance(exception, RateLimitError) and exception.code == "insufficient_quota":
+        return False
+    return isinstance(exception, RETRYABLE_ERRORS)
+
+
+def _wait_for_retry(retry_state: RetryCallState) -> float:
+    # Honour the server's Retry-After header up to the backoff cap, falling
+    # back to exponential backoff
+    response = getattr(retry_state.outcome.exception(), "response", None)
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), EMBEDDING_MAX_BACKOFF)
+        except ValueError:
+            pass
+    return _exponential_wait(retry_state)
+
+
+@retry(
+    retry=retry_if_exception(_should_retry),
+    wait=_wait_for_retry,
+    stop=stop_after_attempt(EMBEDDING_MAX_RETRIES),
+    reraise=True
+)
+async def _create_embeddings(client: AsyncOpenAI, texts: List[str]) -> List[List[float]]:
+    # SDK retries are disabled so this tenacity policy is the only one applied
+    async with embedding_rate_limiter:
+        response = await client.with_options(max_retries=0).embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+@cache
+def get_embedding_encoding() -> tiktoken.Encoding:
+    # Loaded on first use, since tiktoken downloads the encoding the first time
+    return tiktoken.encoding_for_model(EMBEDDING_MODEL)
+
+
+def _fit_embedding_input(text: str) -> Tuple[str, int]:
+    # Truncate texts over the per-input limit and return the token count sent
+    encoding = get_embedding_encoding()
+    tokens = encoding.encode(text)
+    if len(tokens) > EMBEDDING_MAX_INPUT_TOKENS:
+        tokens = tokens[:EMBEDDING_MAX_INPUT_TOKENS]
+        text = encoding.decode(tokens)
+    return text, len(tokens)
+
+
+def _token_batches(indices: List[int], token_counts: List[int]) -> List[List[int]]:
+    # Group inputs greedily under both the input count and request token limits
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for i, tokens in zip(indices, token_counts):
+        if batch and (len(batch) == EMBEDDING_BATCH_SIZE or batch_tokens + tokens > EMBEDDING_MAX_REQUEST_TOKENS):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def _embed_batch(client: AsyncOpenAI, semaphore: asyncio.Semaphore, texts: List[str]) -> List[List[float]]:
+    async with semaphore:
+        return await _create_embeddings(client, texts)
+
+
+async def embed_texts_async(
+    texts: List[str],
+    api_key: str,
+    on_progress: Optional[Callable[[float], None]] = None
+) -> np.ndarray:
+    """
+    Embed texts with concurrent batched requests to the OpenAI API,
+    skipping duplicate texts and texts already present in the embedding cache
+    
+    Args:
+        texts (list): Texts to embed
+        api_key (str): OpenAI API key
+        on_progress (callable): Called with the fraction of texts embedded so far
+    
+    Returns:
+        np.ndarray: float32 matrix with one embedding row per text, in input order
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    
+    # Embed each distinct text once and map duplicates back to its vector
+    unique_texts = []
+    keys = []
+    unique_positions = {}
+    positions = []
+    for text in texts:
+        key = embedding_key(text)
+        if key not in unique_positions:
+            unique_positions[key] = len(unique_texts)
+            unique_texts.append(text)
+            keys.append(key)
+        positions.append(unique_positions[key])
+    
+    # Serve previously embedded texts from the cache
+    vectors = [get_cached_embedding(key) for key in keys]
+    misses = [i for i, vector in enumerate(vectors) if vector is None]
+    
+    embedded = len(unique_texts) - len(misses)
+    if on_progress is not None:
+        on_progress(embedded / len(unique_texts))
+    
+    async def embed_and_store(batch: List[int]):
+        nonlocal embedded
+        batch_vectors = np.asarray(
+            await _embed_batch(client, semaphore, [inputs[i] for i in batch]),
+            dtype=np.float32
+        )
+        # Cache each batch as it lands so a later failure keeps what was paid for
+        set_cached_embeddings([keys[i] for i in batch], batch_vectors)
+        for i, vector in zip(batch, batch_vectors):
+            vectors[i] = vector
+        embedded += len(batch)
+        if on_progress is not None:
+            on_progress(embedded / len(unique_texts))
+    
+    if misses:
+        # Texts over the input limit are embedded from their leading tokens;
+        # the cache stays keyed by the full text
+        inputs = {}
+        token_counts = []
+        for i in misses:
+            inputs[i], tokens = _fit_embedding_input(unique_texts[i])
+            token_counts.append(tokens)
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+        batches = _token_batches(misses, token_counts)
+        client = get_openai_client(api_key)
+        tasks = [asyncio.ensure_future(embed_and_store(batch)) for batch in batches]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Stop the batches still in flight instead of leaving them running
+            for task in tasks:
+                task.cancel()
+            raise
+    
+    return np.vstack(vectors)[positions]
+
+
+def embed_texts(
+    texts: List[str],
+    api_key: str,
+    on_progress: Optional[Callable[[float], None]] = None
+) -> np.ndarray:
+    return run_async(embed_texts_async(texts, api_key, on_progress))
+
+
+class IngestProgress:
+    """
+    Progress of an ingestion, updated by the worker thread and polled by the UI
+    
+    The total is the number of log entries; done counts up to twice that,
+    once while embedding and once while storing in ChromaDB.
+    """
+    def __init__(self):
+        self.done = 0
+        self.total = 0
+
+
+def ingest(data: bytes, api_key: str, progress: Optional[IngestProgress] = None) -> int:
+    """
+    Embed the log entries of a JSON document and store them in ChromaDB
+    
+    Args:
+        data (bytes): Contents of a JSON file containing an array of log entries
+        api_key (str): OpenAI API key
+        progress (IngestProgress): Updated as entries are embedded and stored
+    
+    Returns:
+        int: Number of log entries stored
+    
+    Raises:
+        ValueError: If the document is not a JSON array
+    """
+    try:
+        json_data = orjson.loads(data)
+    except orjson.JSONDecodeError:
+        raise ValueError("Invalid JSON file")
+    if not isinstance(json_data, list):
+        raise ValueError("JSON file should contain an array of objects")
+    return _store_logs(json_data, api_key, progress or IngestProgress())
+
+
+def _log_metadata(index: int, log_entry: Any) -> Dict[str, Any]:
+    metadata = {"index": index}
+    timestamp = parse_timestamp(log_entry) if isinstance(log_entry, dict) else None
+    if timestamp is not None:
+        # Epoch milliseconds, used for the recency bonus when re-ranking
+        metadata["timestamp"] = int(timestamp.timestamp() * 1000)
+    return metadata
+
+
+def _store_logs(json_data: List[Any], api_key: str, progress: IngestProgress) -> int:
+    # Convert each JSON object to a string with its metadata
+    texts = [orjson.dumps(log_entry).decode() for log_entry in json_data]
+    metadatas = [_log_metadata(i, log_entry) for i, log_entry in enumerate(json_data)]
+    progress.total = len(texts)
+    
+    def report_embedded(fraction: float):
+        progress.done = round(fraction * len(texts))
+    
+    # Compute float32 embeddings with concurrent batched requests
+    vectors = embed_texts(texts, api_key, on_progress=report_embedded)
+    
+    # Store in ChromaDB in batches
+    ids = [str(uuid.uuid4()) for _ in texts]
+    collection = get_collection()
+    for start in range(0, len(texts), INGEST_BATCH_SIZE):
+        end = min(start + INGEST_BATCH_SIZE, len(texts))
+        collection.add(
+            ids=ids[start:end],
+            documents=texts[start:end],
+            embeddings=vectors[start:end],
+            metadatas=metadatas[start:end]
+        )
+        progress.done = len(texts) + end
+    
+    # Keep filterable fields in a columnar file alongside ChromaDB
+    append_metadata(build_metadata_table(ids, json_data))
+    return len(texts)
@@ -0,0 +1,124 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import diskcache
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+META_PATH = "./meta.parquet"
+
+META_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("level", pa.int16()),
+    ("source", pa.dictionary(pa.int32(), pa.string())),
+])
+
+
+def parse_timestamp(log_entry: Dict[str, Any]) -> Optional[datetime]:
+    value = log_entry.get("@timestamp") or log_entry.get("timestamp")
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _parse_level(log_entry: Dict[str, Any]) -> Optional[int]:
+    rule = log_entry.get("rule")
+    try:
+        return int(rule["level"])
+    except (TypeError, KeyError, ValueError):
+        return None
+
+
+def _parse_source(log_entry: Dict[str, Any]) -> Optional[str]:
+    agent = log_entry.get("agent")
+    return agent.get("name") if isinstance(agent, dict) else None
+
+
+def build_metadata_table(ids: List[str], log_entries: List[Any]) -> pa.Table:
+    """
+    Extract the filterable fields of each log entry into columns
+    
+    Args:
+        ids (list): ChromaDB ids of the log entries
+        log_entries (list): Parsed log entries, in the same order as ids
+    
+    Returns:
+        pa.Table: One row per log entry with id, timestamp, level and source
+    """
+    entries = [log_entry if isinstance(log_entry, dict) else {} for log_entry in log_entries]
+    return pa.table({
+        "id": pa.array(ids, type=pa.string()),
+        "timestamp": pa.array([parse_timestamp(e) for e in entries], type=pa.timestamp("ms", tz="UTC")),
+        "level": pa.array([_parse_level(e) for e in entries], type=pa.int16()),
+        "source": pa.array([_parse_source(e) for e in entries], type=pa.string()).dictionary_encode(),
+    }, schema=META_SCHEMA)
+
+
+def append_metadata(table: pa.Table):
+    """
+    Append rows to the metadata file, replacing it atomically
+    """
+    # Concurrent ingestions would otherwise read the same file and drop rows;
+    # the lock lives beside the file rather than in a cache that evicts
+    with diskcache.Cache(META_PATH + ".lock") as lock_cache, diskcache.Lock(lock_cache, "write", expire=300):
+        if os.path.exists(META_PATH):
+            table = pa.concat_tables([pq.read_table(META_PATH).cast(META_SCHEMA), table])
+        tmp_path = META_PATH + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, META_PATH)
+
+
+def list_sources() -> List[str]:
+    if not os.path.exists(META_PATH):
+        return []
+    sources = pq.read_table(META_PATH, columns=["source"])["source"]
+    return sorted(pc.unique(pc.cast(sources, pa.string())).drop_null().to_pylist())
+
+
+def filter_log_ids(
+    min_level: Optional[int] = None,
+    sources: Optional[List[str]] = None,
+    since: Optional[datetime] = None
+) -> List[str]:
+    """
+    Find the ids of log entries matching every given filter
+    
+    Args:
+        min_level (int): Lowest rule level to keep
+        sources (list): Agent names to keep
+        since (datetime): Earliest timestamp to keep
+    
+    Returns:
+        list: Ids of the matching log entries
+    """
+    if not os.path.exists(META_PATH):
+        return []
+    columns = ["id"]
+    if min_level is not None:
+        columns.append("level")
+    if sources:
+        columns.append("source")
+    if since is not None:
+        columns.append("timestamp")
+    table = pq.read_table(META_PATH, columns=columns)
+    
+    conditions = []
+    if min_level is not None:
+        conditions.append(pc.greater_equal(table["level"], min_level))
+    if sources:
+        conditions.append(pc.is_in(pc.cast(table["source"], pa.string()), value_set=pa.array(sources)))
+    if since is not None:
+        conditions.append(pc.greater_equal(table["timestamp"], pa.scalar(since, type=pa.timestamp("ms", tz="UTC"))))
+    if not conditions:
+        return table["id"].to_pylist()
+    
+    mask = conditions[0]
+    for condition in conditions[1:]:
+        mask = pc.and_(mask, condition)
+    return table.filter(mask)["id"].to_pylist()
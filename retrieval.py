@@ -0,0 +1,167 @@
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ingest import embed_texts, get_collection
+
+# Weight of the recency bonus against cosine similarity when re-ranking
+RECENCY_WEIGHT = 0.1
+# Age behind the newest candidate at which the recency bonus halves
+RECENCY_HALF_LIFE_MS = 24 * 60 * 60 * 1000
+
+
+def existing_ids(collection, ids: List[str]) -> List[str]:
+    """
+    Keep only the ids present in the collection, since query(ids=...) fails
+    on any id it cannot find
+    """
+    if not ids:
+        return []
+    return collection.get(ids=ids, include=[])["ids"]
+
+
+def set_search_ef(collection, search_ef: int):
+    """
+    Change the HNSW search breadth used by queries, trading recall for latency
+    
+    The value is persisted on the collection and shared by every session, so
+    callers apply it before each search; it is only written when it differs.
+    """
+    if (collection.configuration.get("hnsw") or {}).get("ef_search") != search_ef:
+        collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+
+
+def rerank(distances, timestamps, top_k: int) -> np.ndarray:
+    """
+    Score candidates by cosine similarity plus a recency bonus and keep the best
+    
+    Args:
+        distances: Cosine distances of the candidates returned by ChromaDB
+        timestamps: Epoch milliseconds of each candidate, None when unknown
+        top_k (int): Number of candidates to keep
+    
+    Returns:
+        np.ndarray: Indices of the kept candidates, best first
+    """
+    similarity = 1 - np.asarray(distances, dtype=np.float32)
+    times = np.array([np.nan if t is None else t for t in timestamps], dtype=np.float64)
+    recency = np.zeros_like(similarity)
+    if not np.isnan(times).all():
+        # Halve the bonus for every half-life behind the newest candidate
+        age = np.nanmax(times) - times
+        recency = np.nan_to_num(0.5 ** (age / RECENCY_HALF_LIFE_MS), nan=0.0).astype(np.float32)
+    scores = similarity + RECENCY_WEIGHT * recency
+    if top_k < len(scores):
+        top = np.argpartition(-scores, top_k)[:top_k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+@lru_cache(maxsize=256)
+def embed_query(question: str, api_key: str) -> Tuple[float, ...]:
+    """
+    Embed a search question, memoized so repeated questions skip the API call
+    """
+    return tuple(embed_texts([question], api_key)[0].tolist())
+
+
+def search(
+    collection,
+    query_vectors,
+    k: int = 20,
+    top_k: int = 8,
+    ids: Optional[List[str]] = None,
+    search_ef: Optional[int] = None
+) -> List[List[str]]:
+    """
+    Search ChromaDB with one query for all vectors and re-rank each result
+    
+    Args:
+        collection: ChromaDB collection holding the log embeddings
+        query_vectors: One embedding per question
+        k (int): Number of candidate chunks to retrieve per question
+        top_k (int): Number of re-ranked chunks to return per question
+        ids (list): Restrict the search to these log entry ids
+        search_ef (int): HNSW search breadth to apply before searching
+    
+    Returns:
+        list: One list of relevant log entry strings per query vector
+    """
+    if len(query_vectors) == 0:
+        return []
+    if ids is not None:
+        # The metadata file can list ids the collection no longer holds
+        ids = existing_ids(collection, ids)
+        if not ids:
+            return [[] for _ in query_vectors]
+    if search_ef is not None:
+        # Shared by all sessions, so re-apply the caller's value before searching
+        set_search_ef(collection, search_ef)
+    
+    results = collection.query(
+        query_embeddings=query_vectors,
+        ids=ids,
+        n_results=k,
+        include=["documents", "metadatas", "distances"]
+    )
+    chunks = []
+    for documents, metadatas, distances in zip(results["documents"], results["metadatas"], results["distances"]):
+        # Keep the top_k candidates by similarity and recency
+        timestamps = [(metadata or {}).get("timestamp") for metadata in metadatas]
+        top = rerank(distances, timestamps, top_k)
+        chunks.append([documents[i] for i in top])
+    return chunks
+
+
+def get_relevant_chunks(
+    question: str,
+    api_key: str,
+    k: int = 20,
+    top_k: int = 8,
+    ids: Optional[List[str]] = None,
+    search_ef: Optional[int] = None,
+    collection=None
+) -> List[str]:
+    """
+    Fetch the re-ranked chunks relevant to a question
+    
+    Args:
+        question (str): User's question
+        api_key (str): OpenAI API key
+        k (int): Number of candidate chunks to retrieve
+        top_k (int): Number of re-ranked chunks to return
+        ids (list): Restrict the search to these log entry ids
+        search_ef (int): HNSW search breadth to apply before searching
+        collection: Collection to search, opened with get_collection by default
+    
+    Returns:
+        list: List of relevant log entry strings
+    """
+    query_vector = list(embed_query(question, api_key))
+    return search(collection if collection is not None else get_collection(), [query_vector], k, top_k, ids, search_ef)[0]
+
+
+def get_relevant_chunks_batch(
+    questions: List[str],
+    api_key: str,
+    k: int = 20,
+    top_k: int = 8,
+    ids: Optional[List[str]] = None,
+    search_ef: Optional[int] = None,
+    collection=None
+) -> List[List[str]]:
+    """
+    Fetch relevant chunks for several questions with a single ChromaDB query
+    
+    Takes the same arguments as get_relevant_chunks, with a list of questions.
+    
+    Returns:
+        list: One list of relevant log entry strings per question
+    """
+    if not questions:
+        return []
+    # Embed all questions together and search them in one call
+    query_vectors = embed_texts(questions, api_key)
+    return search(collection if collection is not None else get_collection(), query_vectors, k, top_k, ids, search_ef)
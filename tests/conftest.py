@@ -0,0 +1,66 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import diskcache
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import ingest  # noqa: E402
+import log_metadata  # noqa: E402
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.inputs = []
+        # Exceptions raised by the next calls in order, None for a success
+        self.failures = []
+
+    async def create(self, model, input):
+        self.inputs.append(list(input))
+        if self.failures:
+            failure = self.failures.pop(0)
+            if failure is not None:
+                raise failure
+        # Return items out of order to check they are reassembled by index
+        data = [
+            SimpleNamespace(index=i, embedding=[float(len(text)), float(i)])
+            for i, text in enumerate(input)
+        ]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+class ByteEncoding:
+    # One token per UTF-8 byte, so tests do not need the tiktoken download
+    def encode(self, text):
+        return list(text.encode())
+
+    def decode(self, tokens):
+        return bytes(tokens).decode("utf-8", "ignore")
+
+
+class FakeClient:
+    def __init__(self):
+        self.embeddings = FakeEmbeddings()
+        self.options = []
+
+    def with_options(self, **options):
+        self.options.append(options)
+        return self
+
+
+@pytest.fixture
+def fake_client(monkeypatch, tmp_path):
+    client = FakeClient()
+    monkeypatch.setattr(cache, "embedding_cache", diskcache.Cache(str(tmp_path / "emb_cache")))
+    monkeypatch.setattr(ingest, "get_openai_client", lambda api_key: client)
+    monkeypatch.setattr(ingest, "get_embedding_encoding", lambda: ByteEncoding())
+    return client
+
+
+@pytest.fixture
+def stores(monkeypatch, tmp_path):
+    monkeypatch.setattr(ingest, "CHROMA_PATH", str(tmp_path / "chroma_db"))
+    monkeypatch.setattr(log_metadata, "META_PATH", str(tmp_path / "meta.parquet"))
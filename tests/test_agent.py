@@ -0,0 +1,124 @@
+import asyncio
+
+import diskcache
+import orjson
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.models.function import DeltaToolCall, FunctionModel
+
+import agent
+
+RESPONSE = {
+    "answer": "Two failed logins from the same host",
+    "relevant_logs": [{"rule": {"level": 5}}],
+    "total_logs_analyzed": 2,
+}
+
+
+class ByteEncoding:
+    # One token per UTF-8 byte, so tests do not need the tiktoken download
+    def encode(self, text):
+        return list(text.encode())
+
+    def decode(self, tokens):
+        return bytes(tokens).decode("utf-8", "ignore")
+
+
+def run_response(messages, info):
+    return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, RESPONSE)])
+
+
+async def stream_response(messages, info):
+    # Emit the output tool arguments in pieces, slower than the stream debounce
+    args = orjson.dumps(RESPONSE).decode()
+    name = info.output_tools[0].name
+    for i in range(0, len(args), 16):
+        yield {0: DeltaToolCall(name=name if i == 0 else None, json_args=args[i:i + 16])}
+        await asyncio.sleep(0.12)
+
+
+@pytest.fixture(autouse=True)
+def byte_encoding(monkeypatch):
+    monkeypatch.setattr(agent, "get_token_encoding", lambda: ByteEncoding())
+
+
+@pytest.fixture
+def fake_agent(monkeypatch, tmp_path):
+    test_agent = Agent(
+        FunctionModel(run_response, stream_function=stream_response),
+        output_type=agent.LogAnalysisResponse
+    )
+    monkeypatch.setattr(agent, "get_agent", lambda api_key: test_agent)
+    monkeypatch.setattr(agent, "agent_cache", diskcache.Cache(str(tmp_path / "agent_cache")))
+    return test_agent
+
+
+def test_fit_to_budget_truncates_overflowing_entry(monkeypatch):
+    monkeypatch.setattr(agent, "CONTEXT_TOKEN_BUDGET", 1_000)
+    monkeypatch.setattr(agent, "PROMPT_TOKEN_RESERVE", 0)
+    path_log = {"raw_content": 'C:\\\\Windows\\\\System32\\\\"cmd.exe"' * 200}
+    logs = [{"rule": {"level": 3}}, path_log, {"rule": {"level": 9}}]
+
+    fitted = agent._fit_to_budget("q", logs)
+
+    assert fitted[0] == logs[0]
+    assert len(fitted) == 2
+    assert path_log["raw_content"].startswith(fitted[1]["raw_content"])
+    used = sum(len(orjson.dumps(log_data)) for log_data in fitted)
+    assert used <= 1_000 - len("q")
+
+
+def test_fit_to_budget_keeps_entries_that_fit():
+    logs = [{"rule": {"level": 3}}, {"raw_content": "plain text"}]
+
+    assert agent._fit_to_budget("q", logs) == logs
+
+
+def test_decode_chunk_falls_back_to_raw_content():
+    assert agent._decode_chunk('{"rule": {"level": 3}}') == {"rule": {"level": 3}}
+    assert agent._decode_chunk("{not json") == {"raw_content": "{not json"}
+    assert agent._decode_chunk("plain text") == {"raw_content": "plain text"}
+
+
+def test_log_analysis_stream_yields_answer_incrementally(fake_agent):
+    stream = agent.LogAnalysisStream("Any failed logins?", ['{"a": 1}', "plain text"], "key")
+
+    chunks = list(stream)
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == RESPONSE["answer"]
+    assert stream.response == agent.LogAnalysisResponse(**RESPONSE)
+
+
+def test_log_analysis_stream_serves_cached_response(fake_agent):
+    list(agent.LogAnalysisStream("Any failed logins?", ['{"a": 1}'], "key"))
+    stream = agent.LogAnalysisStream("Any failed logins?", ['{"a": 1}'], "key")
+
+    assert list(stream) == [RESPONSE["answer"]]
+    assert stream.response == agent.LogAnalysisResponse(**RESPONSE)
+
+
+def test_analyze_logs_with_agent_shares_cache_with_stream(fake_agent):
+    response = agent.analyze_logs_with_agent("Any failed logins?", ['{"a": 1}'], "key")
+    stream = agent.LogAnalysisStream("Any failed logins?", ['{"a": 1}'], "key")
+
+    assert response == agent.LogAnalysisResponse(**RESPONSE)
+    assert list(stream) == [RESPONSE["answer"]]
+
+
+def test_analyze_logs_with_agent_returns_error_response(fake_agent, monkeypatch):
+    def failing_agent(api_key):
+        raise RuntimeError("model unavailable")
+    monkeypatch.setattr(agent, "get_agent", failing_agent)
+
+    response = agent.analyze_logs_with_agent("Any failed logins?", ['{"a": 1}'], "key")
+
+    assert response.answer == "Error analyzing logs: model unavailable"
+    assert response.total_logs_analyzed == 0
+
+
+def test_log_analysis_response_requires_all_fields():
+    schema = agent.LogAnalysisResponse.model_json_schema()
+
+    assert set(schema["required"]) == {"answer", "relevant_logs", "total_logs_analyzed"}
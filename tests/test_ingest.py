@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import orjson
+import pytest
+from openai import APIConnectionError, RateLimitError
+
+import ingest
+import log_metadata
+from clients import run_async
+
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+
+
+def rate_limit_error(retry_after="0", code=None):
+    response = httpx.Response(429, headers={"Retry-After": retry_after}, request=REQUEST)
+    return RateLimitError("Rate limit reached", response=response, body={"code": code})
+
+
+def test_embed_texts_async_dedupes_and_keeps_order(fake_client):
+    texts = ["a", "bbb", "a", "cc"]
+
+    vectors = run_async(ingest.embed_texts_async(texts, "key"))
+
+    assert fake_client.embeddings.inputs == [["a", "bbb", "cc"]]
+    assert vectors.dtype == np.float32
+    np.testing.assert_array_equal(vectors[:, 0], [1, 3, 1, 2])
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+
+
+def test_embed_texts_async_serves_cache_hits(fake_client):
+    first = run_async(ingest.embed_texts_async(["a", "bbb"], "key"))
+    second = run_async(ingest.embed_texts_async(["bbb", "dddd", "a"], "key"))
+
+    assert fake_client.embeddings.inputs == [["a", "bbb"], ["dddd"]]
+    np.testing.assert_array_equal(second[0], first[1])
+    np.testing.assert_array_equal(second[2], first[0])
+    assert second[1][0] == 4
+
+
+def test_embed_texts_async_empty_input(fake_client):
+    vectors = run_async(ingest.embed_texts_async([], "key"))
+
+    assert vectors.shape == (0, 0)
+    assert fake_client.embeddings.inputs == []
+
+
+def test_embed_texts_async_retries_transient_errors_without_sdk_retries(fake_client, monkeypatch):
+    monkeypatch.setattr(ingest, "_exponential_wait", lambda retry_state: 0)
+    fake_client.embeddings.failures = [rate_limit_error(), APIConnectionError(request=REQUEST)]
+
+    vectors = run_async(ingest.embed_texts_async(["a"], "key"))
+
+    assert len(fake_client.embeddings.inputs) == 3
+    assert all(options == {"max_retries": 0} for options in fake_client.options)
+    assert vectors[0][0] == 1
+
+
+def test_embed_texts_async_does_not_retry_exhausted_quota(fake_client):
+    fake_client.embeddings.failures = [rate_limit_error(code="insufficient_quota")]
+
+    with pytest.raises(RateLimitError):
+        run_async(ingest.embed_texts_async(["a"], "key"))
+
+    assert len(fake_client.embeddings.inputs) == 1
+
+
+def test_embed_texts_async_caches_finished_batches_when_one_fails(fake_client, monkeypatch):
+    monkeypatch.setattr(ingest, "EMBEDDING_BATCH_SIZE", 1)
+    monkeypatch.setattr(ingest, "EMBEDDING_CONCURRENCY", 1)
+    fake_client.embeddings.failures = [None, rate_limit_error(code="insufficient_quota")]
+
+    with pytest.raises(RateLimitError):
+        run_async(ingest.embed_texts_async(["a", "bb", "ccc"], "key"))
+    fake_client.embeddings.inputs.clear()
+    vectors = run_async(ingest.embed_texts_async(["a", "bb", "ccc"], "key"))
+
+    assert ["a"] not in fake_client.embeddings.inputs
+    assert ["bb"] in fake_client.embeddings.inputs
+    np.testing.assert_array_equal(vectors[:, 0], [1, 2, 3])
+
+
+def test_embed_texts_async_batches_by_tokens_and_truncates_long_inputs(fake_client, monkeypatch):
+    monkeypatch.setattr(ingest, "EMBEDDING_MAX_REQUEST_TOKENS", 6)
+    monkeypatch.setattr(ingest, "EMBEDDING_MAX_INPUT_TOKENS", 4)
+
+    vectors = run_async(ingest.embed_texts_async(["aa", "bbb", "c", "dddddddd"], "key"))
+
+    assert fake_client.embeddings.inputs == [["aa", "bbb", "c"], ["dddd"]]
+    np.testing.assert_array_equal(vectors[:, 0], [2, 3, 1, 4])
+
+
+def test_retry_after_is_capped_at_max_backoff():
+    retry_state = SimpleNamespace(outcome=SimpleNamespace(exception=lambda: rate_limit_error(retry_after="3600")))
+
+    assert ingest._wait_for_retry(retry_state) == ingest.EMBEDDING_MAX_BACKOFF
+
+
+def test_ingest_stores_entries_and_reports_progress(fake_client, stores):
+    logs = [{"@timestamp": "2025-05-28T14:22:47Z", "agent": {"name": "WEB-01"}}, {"message": "no time"}]
+    progress = ingest.IngestProgress()
+
+    assert ingest.ingest(orjson.dumps(logs), "key", progress) == 2
+
+    assert (progress.done, progress.total) == (4, 2)
+    stored = ingest.get_collection().get(include=["documents", "metadatas"])
+    assert sorted(stored["documents"]) == sorted(orjson.dumps(log).decode() for log in logs)
+    assert sorted(stored["ids"]) == sorted(log_metadata.filter_log_ids())
+    assert log_metadata.list_sources() == ["WEB-01"]
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"{not json", "Invalid JSON file"),
+    (b'{"a": 1}', "JSON file should contain an array of objects"),
+])
+def test_ingest_rejects_malformed_json(data, message, stores):
+    with pytest.raises(ValueError, match=message):
+        ingest.ingest(data, "key")
+
+
+def test_ingest_keeps_embedding_error_type(fake_client, stores):
+    fake_client.embeddings.failures = [rate_limit_error(code="insufficient_quota")]
+
+    with pytest.raises(RateLimitError):
+        ingest.ingest(b'[{"message": "x"}]', "key")
+    assert ingest.get_collection().count() == 0
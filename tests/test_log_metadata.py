@@ -0,0 +1,37 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import log_metadata
+
+LOGS = [
+    {"@timestamp": "2025-05-28T14:22:47.456Z", "rule": {"level": 8}, "agent": {"name": "WORKSTATION-DEV-01"}},
+    {"@timestamp": "2025-05-28T10:00:07.234Z", "rule": {"level": 1}, "agent": {"name": "SERVER-WEB-02"}},
+    "not an object",
+]
+
+
+@pytest.fixture(autouse=True)
+def meta_path(monkeypatch, tmp_path):
+    monkeypatch.setattr(log_metadata, "META_PATH", str(tmp_path / "meta.parquet"))
+
+
+def test_append_metadata_keeps_rows_from_earlier_uploads():
+    log_metadata.append_metadata(log_metadata.build_metadata_table(["a", "b", "c"], LOGS))
+    log_metadata.append_metadata(log_metadata.build_metadata_table(["d"], LOGS[:1]))
+
+    assert log_metadata.filter_log_ids() == ["a", "b", "c", "d"]
+    assert log_metadata.list_sources() == ["SERVER-WEB-02", "WORKSTATION-DEV-01"]
+
+
+def test_filter_log_ids_combines_filters():
+    log_metadata.append_metadata(log_metadata.build_metadata_table(["a", "b", "c"], LOGS))
+    noon = datetime(2025, 5, 28, 12, tzinfo=timezone.utc)
+
+    assert log_metadata.filter_log_ids(min_level=5) == ["a"]
+    assert log_metadata.filter_log_ids(sources=["SERVER-WEB-02"]) == ["b"]
+    assert log_metadata.filter_log_ids(min_level=1, since=noon) == ["a"]
+
+
+def test_filter_log_ids_without_metadata_file():
+    assert log_metadata.filter_log_ids(min_level=5) == []
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import orjson
+
+import ingest
+import log_metadata
+import retrieval
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.queries = []
+        self.configuration = {"hnsw": {"ef_search": 64}}
+        self.modified = []
+
+    def modify(self, configuration):
+        self.modified.append(configuration)
+
+    def query(self, query_embeddings, ids, n_results, include):
+        self.queries.append(list(query_embeddings))
+        # Two candidates per query, the second one closer
+        return {
+            "documents": [[f"far {i}", f"near {i}"] for i in range(len(query_embeddings))],
+            "metadatas": [[None, None] for _ in query_embeddings],
+            "distances": [[0.5, 0.1] for _ in query_embeddings],
+        }
+
+
+def test_rerank_trims_to_top_k_with_recency_bonus():
+    day = retrieval.RECENCY_HALF_LIFE_MS
+    distances = [0.10, 0.11, 0.50, 0.12]
+    timestamps = [0, 30 * day, 30 * day, None]
+
+    top = retrieval.rerank(distances, timestamps, 2)
+
+    # The newer of two near-equal matches wins; a recent weak match does not
+    assert list(top) == [1, 0]
+
+
+def test_rerank_without_timestamps_orders_by_similarity():
+    top = retrieval.rerank([0.3, 0.1, 0.2], [None, None, None], 5)
+
+    assert list(top) == [1, 2, 0]
+
+
+def test_get_relevant_chunks_batch_skips_empty_input(fake_client):
+    assert retrieval.get_relevant_chunks_batch([], "key") == []
+    assert fake_client.embeddings.inputs == []
+
+
+def test_get_relevant_chunks_batch_runs_one_query_for_all_questions(fake_client):
+    collection = RecordingCollection()
+
+    chunks = retrieval.get_relevant_chunks_batch(
+        ["a", "bb", "ccc"], "key", top_k=1, search_ef=128, collection=collection
+    )
+
+    assert len(collection.queries) == 1
+    assert len(collection.queries[0]) == 3
+    assert chunks == [["near 0"], ["near 1"], ["near 2"]]
+    assert collection.modified == [{"hnsw": {"ef_search": 128}}]
+
+
+def test_get_relevant_chunks_batch_applies_id_filter(fake_client, stores):
+    ingest.ingest(orjson.dumps([{"message": "x"}, {"message": "y"}]), "key")
+    stored = ingest.get_collection().get(include=["documents"])
+    kept_id, kept_document = stored["ids"][0], stored["documents"][0]
+
+    chunks = retrieval.get_relevant_chunks_batch(["a", "bb"], "key", ids=[kept_id, "missing"])
+    assert chunks == [[kept_document], [kept_document]]
+    assert retrieval.get_relevant_chunks_batch(["a"], "key", ids=["missing"]) == [[]]
+
+
+def test_existing_ids_drops_ids_missing_from_collection(fake_client, stores):
+    ingest.ingest(b'[{"message": "x"}]', "key")
+    stored_id = log_metadata.filter_log_ids()[0]
+
+    assert retrieval.existing_ids(ingest.get_collection(), [stored_id, "missing"]) == [stored_id]
+    assert retrieval.existing_ids(ingest.get_collection(), []) == []
+
+
+def test_set_search_ef_only_writes_changes():
+    modified = []
+    collection = SimpleNamespace(
+        configuration={"hnsw": {"ef_search": 64}},
+        modify=lambda configuration: modified.append(configuration)
+    )
+
+    retrieval.set_search_ef(collection, 64)
+    retrieval.set_search_ef(collection, 128)
+
+    assert modified == [{"hnsw": {"ef_search": 128}}]